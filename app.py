@@ -1,23 +1,245 @@
 import streamlit as st
 import pandas as pd
-from utils.menu_processor import MenuProcessor
 from utils.substitutions import get_substitution_rules, add_substitution_rule
-from utils.database import init_db, get_db, SubstitutionRule
+from utils.database import init_db, SessionLocal, SubstitutionRule
 from utils.confetti import show_confetti
-from utils.excel_exporter import export_to_excel
-from typing import Generator
+from typing import TYPE_CHECKING, Dict, List, Tuple
+from itertools import groupby
+from operator import itemgetter
+import copy
 import hashlib
+import io
+import time
 import streamlit.components.v1 as components
+from sqlalchemy.orm import scoped_session
 
-# Initialize database
-init_db()
+if TYPE_CHECKING:
+    from utils.menu_processor import MenuProcessor
 
-def get_db_session() -> Generator:
-    db = next(get_db())
+# Characters of streamed reasoning shown live; the full text is shown once done
+REASONING_TAIL_CHARS = 2000
+# Separator the model emits between its reasoning and the JSON payload
+JSON_MARKER = "===JSON==="
+# Part of the persisted conversion cache key; bump it whenever convert_menu,
+# the OpenAI prompt or response parsing change so old pickles stop being served
+CONVERSION_CACHE_VERSION = 1
+
+@st.cache_resource
+def _ensure_db() -> bool:
+    """Create the tables once per process rather than on every script run."""
+    init_db()
+    return True
+
+@st.cache_resource
+def _shared_session() -> scoped_session:
+    """Thread-local session registry shared by every rerun in this process."""
+    return scoped_session(SessionLocal)
+
+@st.cache_data(show_spinner=False, ttl=30)
+def _load_custom_rules() -> Dict[str, List[Tuple[int, str, str]]]:
+    """Load custom rules grouped by allergen as (id, original, replacement) tuples.
+
+    Cleared whenever a rule is added or deleted, so reruns don't hit the database;
+    the TTL picks up edits made from other app processes.
+    """
+    db = _shared_session()
+    # Let the database sort by allergen so rows arrive already grouped
+    rows = db.query(
+        SubstitutionRule.allergen,
+        SubstitutionRule.id,
+        SubstitutionRule.original,
+        SubstitutionRule.replacement,
+    ).order_by(SubstitutionRule.allergen, SubstitutionRule.id)
+    return {
+        allergen: [(rule_id, original, replacement) for _, rule_id, original, replacement in group]
+        for allergen, group in groupby(rows, key=itemgetter(0))
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_processor(file_hash: str, _content: memoryview) -> "MenuProcessor":
+    """Parse the uploaded workbook once per file hash instead of on every rerun.
+
+    Takes a view of the upload and only copies it into owned bytes on a cache miss.
+    The instance is shared across sessions, so callers must not mutate it.
+    """
+    # Deferred so the first page render doesn't wait on the parsing stack
+    from utils.menu_processor import MenuProcessor
+    return MenuProcessor(bytes(_content))
+
+class _ConversionNotStored(Exception):
+    """Raised by _stored_conversion on a lookup miss so nothing gets cached."""
+
+@st.cache_data(show_spinner=False, persist="disk", max_entries=200)
+def _stored_conversion(
+    cache_version: int,
+    file_hash: str,
+    allergens_tuple: Tuple[str, ...],
+    rules_tuple: Tuple[Tuple[str, str], ...],
+    _result=None,
+):
+    """Persisted conversion results keyed on logic version, file, allergens and rules.
+
+    Called without _result to look an entry up (a miss raises, and st.cache_data
+    never stores exceptions) and with the finished result to store it. It renders
+    nothing, so a hit doesn't replay UI. Disk entries never expire (Streamlit
+    ignores ttl with persist), so cache_version retires entries written by older
+    conversion logic.
+    """
+    if _result is None:
+        raise _ConversionNotStored
+    return _result
+
+def _stream_conversion(
+    file_hash: str,
+    allergens_tuple: Tuple[str, ...],
+    rules_tuple: Tuple[Tuple[str, str], ...],
+    content: memoryview,
+):
+    """Convert the menu, streaming the AI reasoning while it runs."""
+    # convert_menu reassigns substitution_map, so work on a copy of the shared processor
+    processor = copy.copy(_load_processor(file_hash, content))
+
+    # Create placeholder for reasoning text display
+    st.markdown("**AI Reasoning:**")
+    reasoning_display = st.empty()
+    reasoning_display.text("Waiting for AI to start reasoning...")
+
+    # Accumulate reasoning text for display; StringIO appends in place rather
+    # than rebuilding the whole string on every chunk
+    reasoning_buffer = io.StringIO()
+    reasoning_text = [""]
+    saw_json_marker = [False]
+    # Last few characters seen, enough to catch a marker split across chunks
+    marker_tail = [""]
+    # Time and length of the last repaint, used to coalesce small chunks
+    last_paint = [0.0, 0]
+
+    def update_reasoning(chunk: str):
+        """Callback to update reasoning display with new chunks in real-time"""
+        if chunk:
+            # If we've already hit the JSON marker, ignore further chunks for the reasoning box
+            if saw_json_marker[0]:
+                return
+            reasoning_buffer.write(chunk)
+            # Stop updating the reasoning box once the JSON marker appears; only the
+            # new chunk plus the carried-over tail needs scanning
+            window = marker_tail[0] + chunk
+            marker_tail[0] = window[-(len(JSON_MARKER) - 1):]
+            if JSON_MARKER in window:
+                saw_json_marker[0] = True
+                reasoning_text[0] = reasoning_buffer.getvalue().split(JSON_MARKER)[0].rstrip()
+            # Repaint at most every 100ms unless 512+ new characters are waiting
+            now = time.monotonic()
+            if (not saw_json_marker[0] and now - last_paint[0] < 0.1
+                    and reasoning_buffer.tell() - last_paint[1] < 512):
+                return
+            last_paint[0], last_paint[1] = now, reasoning_buffer.tell()
+            if not saw_json_marker[0]:
+                reasoning_text[0] = reasoning_buffer.getvalue()
+            # Update the placeholder with st.text() for real-time streaming; only the
+            # tail is sent so each update stays small as the reasoning grows
+            reasoning_display.text(reasoning_text[0][-REASONING_TAIL_CHARS:] or "...")
+
+    # Pass progress callback for streaming reasoning
+    modified_df, changes, summary = processor.convert_menu(
+        dict(rules_tuple), list(allergens_tuple), progress_callback=update_reasoning
+    )
+
+    # The caller renders the final reasoning as a text area
+    reasoning_display.empty()
+    if not saw_json_marker[0]:
+        reasoning_text[0] = reasoning_buffer.getvalue()
+    return processor, modified_df, changes, summary, reasoning_text[0]
+
+def _convert(
+    file_hash: str,
+    allergens_tuple: Tuple[str, ...],
+    rules_tuple: Tuple[Tuple[str, str], ...],
+    content: memoryview,
+):
+    """Return the stored conversion, or stream a fresh one and store it."""
+    cache_key = (CONVERSION_CACHE_VERSION, file_hash, allergens_tuple, rules_tuple)
+    try:
+        return _stored_conversion(*cache_key)
+    except _ConversionNotStored:
+        pass
+    result = _stream_conversion(file_hash, allergens_tuple, rules_tuple, content)
+    # Keep failed AI runs out of the cache so pressing Run again retries the call
+    if not result[0].ai_unavailable:
+        _stored_conversion(*cache_key, _result=result)
+    return result
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def _build_excel_bytes(
+    file_hash: str,
+    allergens_tuple: Tuple[str, ...],
+    df_key: str,
+    _modified_df: pd.DataFrame,
+    _processor: "MenuProcessor",
+) -> bytes:
+    """Serialize the highlighted Excel export once per converted menu."""
+    from utils.excel_exporter import export_to_excel
+    return export_to_excel(_modified_df, _processor).getvalue()
+
+def _render_custom_rules(db):
+    """List saved rules in one editable table with a bulk delete."""
+    st.subheader("Custom Rules")
+    saved_rules = _load_custom_rules()
+    if saved_rules:
+        # One table for every rule instead of a text + button pair per rule
+        rules_df = pd.DataFrame(
+            [
+                (rule_id, allergen, rule_original, rule_replacement, False)
+                for allergen, rules in saved_rules.items()
+                for rule_id, rule_original, rule_replacement in rules
+            ],
+            columns=["id", "Allergen", "Original", "Replacement", "Delete"],
+        )
+        edited = st.data_editor(
+            rules_df,
+            column_config={
+                "id": None,
+                "Delete": st.column_config.CheckboxColumn("🗑️", default=False),
+            },
+            disabled=["Allergen", "Original", "Replacement"],
+            hide_index=True,
+            key="custom_rules_editor",
+        )
+        selected_ids = edited.loc[edited["Delete"], "id"].tolist()
+        if st.button("Delete selected", disabled=not selected_ids):
+            from utils.substitutions import delete_substitution_rules
+            if delete_substitution_rules(selected_ids, db):
+                _load_custom_rules.clear()
+                st.success("Rules deleted!")
+                st.rerun(scope="fragment")
+    else:
+        st.text("No custom rules added yet.")
+
+@st.fragment
+def _rules_sidebar():
+    """Sidebar panel for adding, listing and deleting custom substitution rules."""
+    db = _shared_session()
     try:
-        yield db
+        # Add custom substitution rules
+        st.subheader("Add Custom Substitution")
+        with st.form("new_rule"):
+            allergen = st.selectbox("Allergen", ["Gluten", "Dairy", "Nuts", "Egg Products", "Soy", "Fish"])
+            original = st.text_input("Original ingredient")
+            replacement = st.text_input("Replacement ingredient")
+
+            if st.form_submit_button("Add Rule"):
+                if original and replacement:
+                    add_substitution_rule(allergen, original, replacement, db)
+                    _load_custom_rules.clear()
+                    st.success("Rule added successfully!")
+                    show_confetti()
+                else:
+                    st.error("Please fill in both original and replacement ingredients.")
+
+        _render_custom_rules(db)
     finally:
-        db.close()
+        # Release the connection at the end of every fragment rerun
+        db.remove()
 
 def main():
     st.set_page_config(
@@ -26,6 +248,9 @@ def main():
         layout="wide"
     )
 
+    # Initialize database
+    _ensure_db()
+
     st.title("🍽️ School Menu Allergen Converter")
     st.write("Transform your school menu into allergen-free versions while maintaining the original format.")
 
@@ -36,9 +261,8 @@ def main():
         st.session_state.current_file_hash = None
     if 'current_allergens' not in st.session_state:
         st.session_state.current_allergens = None
-
-    # Get database session
-    db = next(get_db_session())
+    if 'current_file_id' not in st.session_state:
+        st.session_state.current_file_id = None
 
     # Sidebar for configuration
     st.sidebar.title("Settings")
@@ -50,48 +274,9 @@ def main():
         default=["Gluten", "Dairy"]
     )
 
-    # Add custom substitution rules
-    st.sidebar.subheader("Add Custom Substitution")
-    with st.sidebar.form("new_rule"):
-        allergen = st.selectbox("Allergen", ["Gluten", "Dairy", "Nuts", "Egg Products", "Soy", "Fish"])
-        original = st.text_input("Original ingredient")
-        replacement = st.text_input("Replacement ingredient")
-
-        if st.form_submit_button("Add Rule"):
-            if original and replacement:
-                add_substitution_rule(allergen, original, replacement, db)
-                st.success("Rule added successfully!")
-                show_confetti()
-            else:
-                st.error("Please fill in both original and replacement ingredients.")
-
-    # View existing custom rules with delete option - organized by allergen
-    st.sidebar.subheader("Custom Rules")
-    custom_rules = db.query(SubstitutionRule).all()
-    if custom_rules:
-        # Group rules by allergen
-        allergen_groups = {}
-        for rule in custom_rules:
-            if rule.allergen not in allergen_groups:
-                allergen_groups[rule.allergen] = []
-            allergen_groups[rule.allergen].append(rule)
-        
-        # Display rules grouped by allergen
-        for allergen in sorted(allergen_groups.keys()):
-            st.sidebar.markdown(f"**{allergen}**")
-            for rule in allergen_groups[allergen]:
-                col1, col2 = st.sidebar.columns([4, 1])
-                with col1:
-                    st.text(f"{rule.original} → {rule.replacement}")
-                with col2:
-                    if st.button("🗑️", key=f"delete_{rule.id}"):
-                        from utils.substitutions import delete_substitution_rule
-                        if delete_substitution_rule(rule.id, db):
-                            st.success("Rule deleted!")
-                            st.rerun()
-            st.sidebar.divider()
-    else:
-        st.sidebar.text("No custom rules added yet.")
+    # Rule management reruns on its own so edits don't rerun the main pane
+    with st.sidebar:
+        _rules_sidebar()
 
     # File upload
     uploaded_file = st.file_uploader(
@@ -101,11 +286,17 @@ def main():
 
     if uploaded_file:
         try:
-            # Read the file content
-            content_bytes = uploaded_file.getvalue()
+            # Zero-copy view of the upload; getvalue() would copy the whole file
+            content_view = uploaded_file.getbuffer()
 
-            # Calculate hash of file content to detect changes
-            file_hash = hashlib.md5(content_bytes).hexdigest()
+            # Calculate hash of file content to detect changes (cache key only, so
+            # use the faster blake2b rather than a cryptographic-strength digest).
+            # Only hash when a new upload arrives, not on every widget rerun.
+            if uploaded_file.file_id != st.session_state.current_file_id:
+                st.session_state.current_file_id = uploaded_file.file_id
+                file_hash = hashlib.blake2b(content_view, digest_size=16).hexdigest()
+            else:
+                file_hash = st.session_state.current_file_hash
             
             # Check if this is a new file or settings changed - clear results if so
             allergens_tuple = tuple(sorted(allergens))
@@ -115,8 +306,8 @@ def main():
                 st.session_state.current_file_hash = file_hash
                 st.session_state.current_allergens = allergens_tuple
 
-            # Initialize processor with raw content
-            processor = MenuProcessor(content_bytes)
+            # Reuse the parsed workbook across reruns of the same upload
+            processor = _load_processor(file_hash, content_view)
 
             # Add Run button
             st.markdown("---")
@@ -124,44 +315,20 @@ def main():
 
             # Only process when Run button is clicked
             if run_button:
-                # Create placeholder for reasoning text display
-                st.markdown("**AI Reasoning:**")
-                reasoning_display = st.empty()
-                reasoning_display.text("Waiting for AI to start reasoning...")
-                
-                # Accumulate reasoning text for display
-                accumulated_reasoning = [""]
-                saw_json_marker = [False]
-                
-                def update_reasoning(chunk: str):
-                    """Callback to update reasoning display with new chunks in real-time"""
-                    if chunk:
-                        # If we've already hit the JSON marker, ignore further chunks for the reasoning box
-                        if saw_json_marker[0]:
-                            return
-                        accumulated_reasoning[0] += chunk
-                        # Stop updating the reasoning box once the JSON marker appears
-                        if "===JSON===" in accumulated_reasoning[0]:
-                            saw_json_marker[0] = True
-                            accumulated_reasoning[0] = accumulated_reasoning[0].split("===JSON===")[0].rstrip()
-                        # Update the placeholder with st.text() for real-time streaming
-                        reasoning_display.text(accumulated_reasoning[0] if accumulated_reasoning[0] else "...")
-                
                 with st.spinner("Processing your menu..."):
-                    # Get custom substitution rules with database access
-                    custom_rules = get_substitution_rules(allergens, db)
+                    # Filter the rules already loaded for the sidebar instead of querying again
+                    custom_rules = get_substitution_rules(allergens, prefetched=_load_custom_rules())
 
                     # Process menu with both custom rules and allergens for AI processing
-                    # Pass progress callback for streaming reasoning
-                    modified_df, changes, summary = processor.convert_menu(
-                        custom_rules, allergens, progress_callback=update_reasoning
+                    processor, modified_df, changes, summary, reasoning_text = _convert(
+                        file_hash, allergens_tuple, tuple(custom_rules.items()), content_view
                     )
-                
+
                 # Final update - convert to text area for better readability after completion
-                if accumulated_reasoning[0]:
-                    reasoning_display.text_area(
+                if reasoning_text:
+                    st.text_area(
                         "Reasoning",
-                        value=accumulated_reasoning[0],
+                        value=reasoning_text,
                         height=200,
                         disabled=True,
                         label_visibility="collapsed",
@@ -223,35 +390,43 @@ def main():
                 replaced_meals = summary.get('replaced', [])
                 unreplaced_meals = summary.get('unreplaced', [])
 
+                # Render each list as a single element rather than one element per item
                 if replaced_meals:
                     st.subheader("Substitutions Made")
-                    for item in replaced_meals:
-                        st.success(
-                            f"Week {item['week']} {item['day']} ({item['meal_type']}): "
-                            f"{item['original']} → {item['replacement']}"
-                        )
+                    st.success("\n".join(
+                        f"- Week {item['week']} {item['day']} ({item['meal_type']}): "
+                        f"{item['original']} → {item['replacement']}"
+                        for item in replaced_meals
+                    ))
 
                 if unreplaced_meals:
                     st.subheader("Unreplaced meals (no allergen conflicts)")
-                    for item in unreplaced_meals:
-                        st.info(
-                            f"Week {item['week']} {item['day']} ({item['meal_type']}): {item['text']}"
-                        )
+                    st.info("\n".join(
+                        f"- Week {item['week']} {item['day']} ({item['meal_type']}): {item['text']}"
+                        for item in unreplaced_meals
+                    ))
 
                 if results['changes']:
                     st.subheader("Raw change log")
-                    for change in results['changes']:
-                        st.caption(change)
+                    st.caption("  \n".join(results['changes']))
 
                 # Export options
                 st.subheader("Export Modified Menu")
                 
-                # Generate Excel file with red highlighting for substitutions
-                excel_buffer = export_to_excel(results['modified_df'], results['processor'])
+                # Generate Excel file with red highlighting for substitutions, reusing
+                # the bytes across reruns until the converted menu changes
+                # Digest the row hashes in order; summing them would ignore row order
+                df_key = hashlib.blake2b(
+                    pd.util.hash_pandas_object(results['modified_df'], index=True).values.tobytes(),
+                    digest_size=16,
+                ).hexdigest()
+                excel_bytes = _build_excel_bytes(
+                    file_hash, allergens_tuple, df_key, results['modified_df'], results['processor']
+                )
                 
                 st.download_button(
                     label="📥 Download Excel (with highlighted substitutions)",
-                    data=excel_buffer,
+                    data=excel_bytes,
                     file_name="modified_menu.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     on_click=show_confetti,
@@ -292,4 +467,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        # Release this run's connection back to the pool
+        _shared_session().remove()
\ No newline at end of file
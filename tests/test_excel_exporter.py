@@ -0,0 +1,86 @@
+import unittest
+
+from openpyxl import load_workbook
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+
+from utils.excel_exporter import export_to_excel, export_to_excel_fast
+from utils.menu_processor import MenuProcessor
+
+
+class ExcelExporterTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open("Menu_Allergy_Sub.xlsm", "rb") as f:
+            cls.sample_bytes = f.read()
+
+    def test_export_highlights_substitutions_in_red(self):
+        processor = MenuProcessor(self.sample_bytes)
+        modified_df, _, _ = processor.convert_menu({"Milk": "Soy milk"}, allergens=[])
+
+        buffer = export_to_excel(modified_df, processor)
+        ws = load_workbook(buffer, rich_text=True)["Menu"]
+
+        # Every substituted cell is rich text with the replacement in a red block
+        self.assertTrue(processor.substitution_map)
+        for row_idx, col_idx in processor.substitution_map:
+            cell = ws.cell(row=row_idx + 1, column=col_idx + 1)
+            self.assertIsInstance(cell.value, CellRichText)
+            red_blocks = [
+                block.text for block in cell.value
+                if isinstance(block, TextBlock) and block.font.color.rgb == "FFFF0000"
+            ]
+            self.assertIn("Soy milk", red_blocks)
+            self.assertEqual(str(cell.value), modified_df.iloc[row_idx, col_idx])
+
+    def test_export_preserves_layout_and_formatting(self):
+        processor = MenuProcessor(self.sample_bytes)
+        modified_df, _, _ = processor.convert_menu({}, allergens=[])
+
+        buffer = export_to_excel(modified_df, processor)
+        ws = load_workbook(buffer)["Menu"]
+
+        self.assertEqual(ws.max_row, len(modified_df))
+        self.assertEqual(ws.max_column, len(modified_df.columns))
+        self.assertEqual(ws.column_dimensions["A"].width, 50)
+
+        first_cell = processor.meal_cells[0]
+        cell = ws.cell(row=first_cell["row"] + 1, column=first_cell["col"] + 1)
+        self.assertEqual(cell.value, first_cell["text"])
+        self.assertTrue(cell.alignment.wrap_text)
+        self.assertEqual(cell.alignment.vertical, "top")
+        self.assertEqual(cell.alignment.horizontal, "left")
+
+    def test_fast_export_matches_openpyxl_export(self):
+        processor = MenuProcessor(self.sample_bytes)
+        modified_df, _, _ = processor.convert_menu({"Milk": "Soy milk"}, allergens=[])
+        # Characters that need escaping must survive the raw XML writer, and control
+        # characters XML cannot hold are dropped the same way by both writers
+        modified_df.iloc[0, 0] = " Fish & chips <b> "
+        modified_df.iloc[0, 1] = "Toast\x01 and jam"
+
+        def sheet_contents(buffer):
+            ws = load_workbook(buffer, rich_text=True)["Menu"]
+            cells = {}
+            for row in ws.iter_rows():
+                for cell in row:
+                    if cell.value is None:
+                        continue
+                    value = cell.value
+                    if isinstance(value, CellRichText):
+                        value = [
+                            (block.text, block.font.color.rgb) if isinstance(block, TextBlock) else block
+                            for block in value
+                        ]
+                    alignment = (cell.alignment.wrap_text, cell.alignment.vertical, cell.alignment.horizontal)
+                    cells[cell.coordinate] = (value, alignment)
+            widths = {key: dim.width for key, dim in ws.column_dimensions.items()}
+            return ws.dimensions, widths, cells
+
+        self.assertEqual(
+            sheet_contents(export_to_excel_fast(modified_df, processor)),
+            sheet_contents(export_to_excel(modified_df, processor)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
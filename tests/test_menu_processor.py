@@ -2,6 +2,7 @@ import io
 import unittest
 from unittest.mock import patch
 
+from utils import menu_processor
 from utils.menu_processor import MenuProcessor
 
 
@@ -11,6 +12,10 @@ class MenuProcessorTests(unittest.TestCase):
         with open("Menu_Allergy_Sub.xlsm", "rb") as f:
             cls.sample_bytes = f.read()
 
+    def setUp(self):
+        # Keep AI results from one test from being served to another
+        menu_processor._AI_CACHE.clear()
+
     def test_extracts_all_meals_from_template(self):
         processor = MenuProcessor(self.sample_bytes)
 
@@ -79,6 +84,73 @@ class MenuProcessorTests(unittest.TestCase):
         modified_df.to_excel(buffer, index=False, header=False)
         self.assertGreater(buffer.tell(), 0)
 
+    def test_repeat_conversion_reuses_cached_ai_results(self):
+        custom_rules = {"Milk": "Soy milk"}
+        ai_subs = {"Cheese": "Vegan cheese"}
+
+        def fake_batch(cells, allergens, rules, progress_callback=None):
+            progress_callback("Checking dairy items...")
+            return [ai_subs]
+
+        with patch(
+            "utils.openai_service.get_batch_ai_substitutions", side_effect=fake_batch
+        ) as mocked_ai:
+            first_df, _, _ = MenuProcessor(self.sample_bytes).convert_menu(
+                custom_rules, allergens=["Dairy"]
+            )
+            streamed = []
+            second_df, _, _ = MenuProcessor(self.sample_bytes).convert_menu(
+                custom_rules, allergens=["Dairy"], progress_callback=streamed.append
+            )
+
+        # Same cells, allergens and rules: the second processor skips the API call
+        mocked_ai.assert_called_once()
+        self.assertTrue(first_df.equals(second_df))
+        self.assertEqual(streamed, ["Checking dairy items..."])
+
+    def test_failed_ai_call_is_flagged_and_retried(self):
+        with patch(
+            "utils.openai_service.get_batch_ai_substitutions", return_value=None
+        ) as mocked_ai:
+            processor = MenuProcessor(self.sample_bytes)
+            processor.convert_menu({"Milk": "Soy milk"}, allergens=["Dairy"])
+            self.assertTrue(processor.ai_unavailable)
+
+            # The failed call was not cached, so the next run asks again
+            processor.convert_menu({"Milk": "Soy milk"}, allergens=["Dairy"])
+        self.assertEqual(mocked_ai.call_count, 2)
+
+    def test_empty_ai_answer_is_cached(self):
+        with patch(
+            "utils.openai_service.get_batch_ai_substitutions", return_value=[{}]
+        ) as mocked_ai:
+            processor = MenuProcessor(self.sample_bytes)
+            processor.convert_menu({"Milk": "Soy milk"}, allergens=["Soy"])
+            self.assertFalse(processor.ai_unavailable)
+
+            # No conflicting items is a real answer, so the next run reuses it
+            processor.convert_menu({"Milk": "Soy milk"}, allergens=["Soy"])
+        mocked_ai.assert_called_once()
+
+    def test_repeated_cells_get_identical_substitutions(self):
+        processor = MenuProcessor(self.sample_bytes)
+        # Repeat the first week's Monday cell on Tuesday, as menus often do across weeks
+        first, second = processor.meal_cells[0], processor.meal_cells[1]
+        processor.original_df.iat[second["row"], second["col"]] = first["text"]
+        second["text"], second["meal_parts"] = first["text"], dict(first["meal_parts"])
+
+        modified_df, _, _ = processor.convert_menu({"Milk": "Soy milk"}, allergens=[])
+
+        self.assertEqual(
+            modified_df.iat[first["row"], first["col"]],
+            modified_df.iat[second["row"], second["col"]],
+        )
+        first_subs = processor.get_substitutions_for_cell(first["row"], first["col"])
+        self.assertTrue(first_subs)
+        self.assertEqual(
+            first_subs, processor.get_substitutions_for_cell(second["row"], second["col"])
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
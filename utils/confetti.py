@@ -1,13 +1,12 @@
 import streamlit as st
 
-def show_confetti():
-    """Show a confetti animation using JavaScript."""
-    # Canvas confetti JS library CDN link
-    confetti_js = "https://cdn.jsdelivr.net/npm/canvas-confetti@1.5.1/dist/confetti.browser.min.js"
-    
-    # JavaScript for triggering confetti - using double braces to escape JavaScript curly braces in f-string
-    confetti_code = f"""
-    <script src="{confetti_js}"></script>
+# Canvas confetti JS library CDN link
+CONFETTI_JS = "https://cdn.jsdelivr.net/npm/canvas-confetti@1.5.1/dist/confetti.browser.min.js"
+
+# JavaScript for triggering confetti, rendered once at import rather than on every call.
+# Using double braces to escape JavaScript curly braces in f-string
+CONFETTI_HTML = f"""
+    <script src="{CONFETTI_JS}"></script>
     <script>
         // Trigger confetti
         var count = 200;
@@ -46,7 +45,9 @@ def show_confetti():
         }});
     </script>
     """
-    
+
+def show_confetti():
+    """Show a confetti animation using JavaScript."""
     # Display using html component
     # Set a small height to ensure the component is rendered but doesn't take up much space
-    st.components.v1.html(confetti_code, height=5)
\ No newline at end of file
+    st.components.v1.html(CONFETTI_HTML, height=5)
\ No newline at end of file
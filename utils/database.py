@@ -1,29 +1,56 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 import os
+import threading
 from datetime import datetime
 
-# Get database URL from environment with error handling
-DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set. Please configure your database connection.")
+_engine = None
+# Streamlit serves sessions on separate threads; only one may build the engine
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
 
-# SQLAlchemy 1.4+ requires postgresql:// instead of postgres://
-if DATABASE_URL.startswith('postgres://'):
-    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+def get_engine():
+    """Create the engine on first use so importing this module never touches the database."""
+    global _engine
+    if _engine is not None:
+        return _engine
 
-# Create engine and session with connection pooling and retry settings
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Test connections before using them
-    pool_recycle=3600,   # Recycle connections after 1 hour
-    connect_args={
-        "connect_timeout": 10,  # Connection timeout in seconds
-        "application_name": "allergen-menu-processor"  # Identify our app in database logs
-    }
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with _engine_lock:
+        if _engine is not None:
+            return _engine
+
+        # Get database URL from environment with error handling
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url:
+            raise ValueError("DATABASE_URL environment variable is not set. Please configure your database connection.")
+
+        # SQLAlchemy 1.4+ requires postgresql:// instead of postgres://
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+        # Create engine and session with connection pooling and retry settings
+        engine = create_engine(
+            database_url,
+            pool_pre_ping=True,  # Test connections before using them
+            pool_size=10,        # Keep warm connections for concurrent sessions
+            max_overflow=10,     # Allow short bursts beyond the pool size
+            pool_timeout=30,     # Wait at most 30 seconds for a free connection
+            pool_recycle=1800,   # Recycle connections after 30 minutes
+            connect_args={
+                "connect_timeout": 10,  # Connection timeout in seconds
+                "application_name": "allergen-menu-processor"  # Identify our app in database logs
+            }
+        )
+        # Bind sessions before publishing the engine to the unlocked fast path
+        _session_factory.configure(bind=engine)
+        _engine = engine
+    return _engine
+
+def SessionLocal() -> Session:
+    """Open a session bound to the shared engine, creating the engine if needed."""
+    get_engine()
+    return _session_factory()
 
 # Create base class for models
 Base = declarative_base()
@@ -45,23 +72,22 @@ class SubstitutionRule(Base):
     replacement = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-# Create tables
+    # Covers the "find the rule for this ingredient under an allergen" lookup
+    __table_args__ = (
+        Index("ix_substitution_rules_allergen_original", "allergen", "original"),
+    )
+
+# Create tables (once per process; repeat calls are no-ops)
+_db_initialized = False
+
 def init_db():
+    global _db_initialized
+    if _db_initialized:
+        return
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
-
-# Database session context manager with error handling
-def get_db():
-    db = None
-    try:
-        db = SessionLocal()
-        yield db
-    except Exception as e:
-        print(f"Database connection error: {str(e)}")
-        # Try to reconnect
-        if db:
-            db.close()
-        db = SessionLocal()
-        yield db
-    finally:
-        if db:
-            db.close()
+    # create_all skips tables that already exist, so add indexes introduced
+    # after the deployed table was created (e.g. the allergen/original index)
+    for index in SubstitutionRule.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    _db_initialized = True
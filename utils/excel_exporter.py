@@ -1,56 +1,95 @@
 import io
 import pandas as pd
-from openpyxl import Workbook
-from openpyxl.cell.text import InlineFont
-from openpyxl.cell.rich_text import TextBlock, CellRichText
-from openpyxl.styles import Alignment, Font
-from openpyxl.utils.dataframe import dataframe_to_rows
 import re
-from typing import Union, List, Tuple
+import zipfile
+from collections import defaultdict
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Dict, Pattern, Union, List, Tuple
+from xml.sax.saxutils import escape
 
+if TYPE_CHECKING:
+    from openpyxl.cell.rich_text import CellRichText
 
-def create_rich_text_cell(original_text: str, substitutions: List[Tuple[str, str]]) -> Union[CellRichText, str]:
-    """
-    Create a rich text cell where substituted ingredients are colored red.
-    
-    Args:
-        original_text: The full cell text
-        substitutions: List of (original_ingredient, replacement_ingredient) tuples
+
+@lru_cache(maxsize=None)
+def _get_openpyxl() -> SimpleNamespace:
+    """Import openpyxl on first use; the raw XML export path never needs it.
     
-    Returns:
-        CellRichText object with substituted ingredients in red, or plain str if no substitutions
+    Also builds the shared style objects every cell reuses instead of creating
+    them per call.
     """
-    if not substitutions:
-        return original_text
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.text import InlineFont
+    from openpyxl.cell.rich_text import TextBlock, CellRichText
+    from openpyxl.styles import Alignment
     
-    # Build a list of text segments with their formatting
-    segments = []
+    return SimpleNamespace(
+        Workbook=Workbook,
+        WriteOnlyCell=WriteOnlyCell,
+        TextBlock=TextBlock,
+        CellRichText=CellRichText,
+        red_font=InlineFont(color='FFFF0000'),  # Red color (8-digit ARGB: alpha=FF, RGB=FF0000)
+        default_alignment=Alignment(wrap_text=True, vertical='top', horizontal='left'),  # Wrap text and align top-left
+    )
+
+
+def _column_letter(col_idx: int) -> str:
+    """Spreadsheet column letter for a 1-based column index (1 -> A, 27 -> AA)."""
+    letters = ""
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+# Control characters that are not allowed anywhere in an XML document
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Menus with at least this many cells are written as raw XML instead of through openpyxl
+FAST_EXPORT_MIN_CELLS = 20000
+
+
+@lru_cache(maxsize=128)
+def _replacement_pattern(replacements: Tuple[str, ...], ignore_case: bool = False) -> Pattern:
+    """Compile one pattern matching any of the replacement texts.
     
-    # Track positions of all substitutions in the modified text
-    current_text = original_text
+    Alternatives are tried longest first and wrapped in a lookahead, so the scan
+    reports the longest match starting at every position, overlaps included.
+    """
+    alternation = "|".join(re.escape(text) for text in sorted(replacements, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))", re.IGNORECASE if ignore_case else 0)
+
+
+def _highlight_spans(text: str, substitutions: List[Tuple[str, str]]) -> List[Tuple[int, int]]:
+    """Return the merged (start, end) spans of ``text`` covered by replacement texts."""
     replacement_positions = []
     
-    # Find all replacement positions in the current text
-    for substitution_tuple in substitutions:
-        # Handle both old format (original, replacement) and new format (original, replacement, meal_type)
-        if len(substitution_tuple) == 3:
-            original, replacement, _ = substitution_tuple
+    # Handle both old format (original, replacement) and new format (original, replacement, meal_type)
+    replacements = tuple(dict.fromkeys(
+        substitution_tuple[1] for substitution_tuple in substitutions if substitution_tuple[1]
+    ))
+    if replacements:
+        # Match lowercase literals against the lowercased text, which is faster than
+        # IGNORECASE; fall back to it when lowercasing shifts character positions
+        lower_text = text.lower()
+        if len(lower_text) == len(text):
+            lower_replacements = tuple(dict.fromkeys(replacement.lower() for replacement in replacements))
+            matches = _replacement_pattern(lower_replacements).finditer(lower_text)
         else:
-            original, replacement = substitution_tuple
-        # Find all occurrences of the replacement text (case-insensitive)
-        pattern = re.compile(re.escape(replacement), re.IGNORECASE)
-        for match in pattern.finditer(current_text):
-            replacement_positions.append((match.start(), match.end(), replacement))
-    
-    # Sort by position
-    replacement_positions.sort()
+            matches = _replacement_pattern(replacements, ignore_case=True).finditer(text)
+        # Every occurrence of every replacement text in one scan;
+        # matches come back in position order, ready to merge
+        for match in matches:
+            replacement_positions.append((match.start(), match.start() + len(match.group(1))))
     
     # Merge overlapping intervals
     merged_positions = []
     if replacement_positions:
-        current_start, current_end, _ = replacement_positions[0]
+        current_start, current_end = replacement_positions[0]
         
-        for next_start, next_end, _ in replacement_positions[1:]:
+        for next_start, next_end in replacement_positions[1:]:
             if next_start < current_end:
                 # Overlap, extend current end
                 current_end = max(current_end, next_end)
@@ -60,36 +99,83 @@ def create_rich_text_cell(original_text: str, substitutions: List[Tuple[str, str
                 current_start, current_end = next_start, next_end
         merged_positions.append((current_start, current_end))
     
-    # Build rich text segments
+    return merged_positions
+
+
+def _text_segments(text: str, substitutions: List[Tuple[str, str]]) -> List[Tuple[str, bool]]:
+    """Split ``text`` into (segment, highlighted) pairs, dropping empty segments."""
+    segments = []
     last_end = 0
-    red_font = InlineFont(color='FFFF0000')  # Red color (8-digit ARGB: alpha=FF, RGB=FF0000)
     
-    for start, end in merged_positions:
+    for start, end in _highlight_spans(text, substitutions):
         # Add normal text before this replacement
         if start > last_end:
-            normal_text = current_text[last_end:start]
-            if normal_text:
-                segments.append(normal_text)
+            segments.append((text[last_end:start], False))
         
-        # Add red text for the replacement (only if not empty)
-        replacement_text = current_text[start:end]
-        if replacement_text:
-            segments.append(TextBlock(red_font, replacement_text))
+        # Add highlighted text for the replacement (only if not empty)
+        if end > start:
+            segments.append((text[start:end], True))
         last_end = end
     
-    # Add any remaining normal text (only if not empty)
-    if last_end < len(current_text):
-        remaining_text = current_text[last_end:]
-        if remaining_text:
-            segments.append(remaining_text)
+    # Add any remaining normal text
+    if last_end < len(text):
+        segments.append((text[last_end:], False))
+    
+    return segments
+
+
+def create_rich_text_cell(original_text: str, substitutions: List[Tuple[str, str]]) -> Union["CellRichText", str]:
+    """
+    Create a rich text cell where substituted ingredients are colored red.
+    
+    Args:
+        original_text: The full cell text
+        substitutions: List of (original_ingredient, replacement_ingredient) tuples
+    
+    Returns:
+        CellRichText object with substituted ingredients in red, or plain str if no substitutions
+    """
+    if not substitutions:
+        return original_text
+    
+    openpyxl = _get_openpyxl()
+    
+    # Build rich text segments, replacements in red
+    segments = [
+        openpyxl.TextBlock(openpyxl.red_font, segment) if highlighted else segment
+        for segment, highlighted in _text_segments(original_text, substitutions)
+    ]
     
     # Create rich text object
     if segments:
-        return CellRichText(*segments)
+        return openpyxl.CellRichText(*segments)
     else:
         return original_text
 
 
+def _cell_rows(df: pd.DataFrame) -> List[list]:
+    """Rows of cell values as plain lists, with None for every missing cell.
+    
+    One vectorized cast replaces a pd.notna call per cell in the export loops.
+    Control characters XML cannot hold are stripped here, so both writers
+    accept exactly the same menus.
+    """
+    rows = df.to_numpy(dtype=object, na_value=None).tolist()
+    for row in rows:
+        for col_idx, cell_value in enumerate(row):
+            if type(cell_value) is str and _ILLEGAL_XML_CHARS.search(cell_value):
+                row[col_idx] = _ILLEGAL_XML_CHARS.sub("", cell_value)
+    return rows
+
+
+def _substitutions_by_row(menu_processor) -> Dict[int, Dict[int, List[Tuple[str, ...]]]]:
+    """Index substitutions by row once instead of looking them up cell by cell."""
+    subs_by_row = defaultdict(dict)
+    for (sub_row, sub_col), cell_subs in menu_processor.substitution_map.items():
+        subs_by_row[sub_row][sub_col] = cell_subs
+    return subs_by_row
+
+
 def export_to_excel(df: pd.DataFrame, menu_processor) -> io.BytesIO:
     """
     Export DataFrame to Excel with red highlighting for substituted ingredients.
@@ -101,45 +187,184 @@ def export_to_excel(df: pd.DataFrame, menu_processor) -> io.BytesIO:
     Returns:
         BytesIO buffer containing the Excel file
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Menu"
-    
-    # Write data to worksheet with rich text formatting
-    for row_idx in range(len(df)):
-        for col_idx in range(len(df.columns)):
-            cell_value = df.iloc[row_idx, col_idx]
-            
-            # Excel cells are 1-indexed
-            excel_row = row_idx + 1
-            excel_col = col_idx + 1
-            
-            if pd.notna(cell_value):
+    # Very large menus, and menus with nothing to highlight, skip openpyxl's per-cell objects entirely
+    if df.size >= FAST_EXPORT_MIN_CELLS or not menu_processor.substitution_map:
+        return export_to_excel_fast(df, menu_processor)
+    
+    # Write-only mode streams rows straight to XML instead of keeping every cell in memory
+    openpyxl = _get_openpyxl()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Menu")
+    
+    # Column widths must be set before any rows are written in write-only mode
+    for col_idx in range(1, len(df.columns) + 1):
+        ws.column_dimensions[_column_letter(col_idx)].width = 50
+    
+    subs_by_row = _substitutions_by_row(menu_processor)
+    
+    # Write data to worksheet row by row with rich text formatting
+    for row_idx, row in enumerate(_cell_rows(df)):
+        row_subs = subs_by_row.get(row_idx, {})
+        row_cells = []
+        for col_idx, cell_value in enumerate(row):
+            if cell_value is not None:
+                text = cell_value if type(cell_value) is str else str(cell_value)
                 # Get substitutions for this cell
-                substitutions = menu_processor.get_substitutions_for_cell(row_idx, col_idx)
+                substitutions = row_subs.get(col_idx)
                 
                 if substitutions:
                     # Create rich text with red highlighting
-                    rich_text = create_rich_text_cell(str(cell_value), substitutions)
-                    ws.cell(row=excel_row, column=excel_col).value = rich_text
+                    value = create_rich_text_cell(text, substitutions)
                 else:
                     # Plain text
-                    ws.cell(row=excel_row, column=excel_col).value = str(cell_value)
+                    value = text
                 
-                # Set alignment to wrap text and align top-left
-                ws.cell(row=excel_row, column=excel_col).alignment = Alignment(
-                    wrap_text=True,
-                    vertical='top',
-                    horizontal='left'
+                cell = openpyxl.WriteOnlyCell(ws, value=value)
+                cell.alignment = openpyxl.default_alignment
+                row_cells.append(cell)
+            else:
+                row_cells.append(None)
+        ws.append(row_cells)
+    
+    # Save to BytesIO buffer
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    
+    return buffer
+
+
+# Fixed parts of the minimal workbook written by export_to_excel_fast
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_CONTENT_TYPES_XML = (
+    _XML_HEADER
+    + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    _XML_HEADER
+    + f'<Relationships xmlns="{_PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_XML = (
+    _XML_HEADER
+    + f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+    '<sheets><sheet name="Menu" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS_XML = (
+    _XML_HEADER
+    + f'<Relationships xmlns="{_PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 1 is the wrap/top/left alignment applied to every written cell
+_STYLES_XML = (
+    _XML_HEADER
+    + f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0" applyAlignment="1">'
+    '<alignment horizontal="left" vertical="top" wrapText="1"/></xf></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_RED_RUN_PROPERTIES = '<rPr><color rgb="FFFF0000"/></rPr>'
+
+
+def _xml_text(text: str) -> str:
+    """Escape text for a <t> element, keeping surrounding whitespace intact."""
+    return '<t xml:space="preserve">' + escape(text) + "</t>"
+
+
+def export_to_excel_fast(df: pd.DataFrame, menu_processor) -> io.BytesIO:
+    """
+    Export DataFrame to Excel by writing the worksheet XML directly.
+    
+    Produces the same sheet as export_to_excel (single "Menu" sheet, 50-wide
+    columns, wrapped top-left cells, substitutions in red) without building
+    openpyxl cell objects, which dominate the cost on very large menus.
+    
+    Args:
+        df: The modified DataFrame to export
+        menu_processor: MenuProcessor instance with substitution_map
+    
+    Returns:
+        BytesIO buffer containing the Excel file
+    """
+    n_cols = len(df.columns)
+    letters = [_column_letter(col_idx) for col_idx in range(1, n_cols + 1)]
+    
+    subs_by_row = _substitutions_by_row(menu_processor)
+    
+    parts = [_XML_HEADER, f'<worksheet xmlns="{_MAIN_NS}">']
+    if n_cols and len(df):
+        parts.append(f'<dimension ref="A1:{letters[-1]}{len(df)}"/>')
+    if n_cols:
+        parts.append("<cols>")
+        parts.extend(
+            f'<col min="{col_idx}" max="{col_idx}" width="50" customWidth="1"/>'
+            for col_idx in range(1, n_cols + 1)
+        )
+        parts.append("</cols>")
+    parts.append("<sheetData>")
+    
+    for row_idx, row in enumerate(_cell_rows(df)):
+        row_number = row_idx + 1
+        row_subs = subs_by_row.get(row_idx, {})
+        parts.append(f'<row r="{row_number}">')
+        for col_idx, cell_value in enumerate(row):
+            if cell_value is None:
+                continue
+            text = cell_value if type(cell_value) is str else str(cell_value)
+            substitutions = row_subs.get(col_idx)
+            segments = _text_segments(text, substitutions) if substitutions else None
+            
+            if segments and any(highlighted for _, highlighted in segments):
+                # Inline rich text: one run per segment, replacements in red
+                body = "".join(
+                    "<r>" + (_RED_RUN_PROPERTIES if highlighted else "") + _xml_text(segment) + "</r>"
+                    for segment, highlighted in segments
                 )
+            else:
+                body = _xml_text(text)
+            parts.append(f'<c r="{letters[col_idx]}{row_number}" s="1" t="inlineStr"><is>{body}</is></c>')
+        parts.append("</row>")
     
-    # Auto-adjust column widths (set to reasonable default)
-    for col in ws.columns:
-        ws.column_dimensions[col[0].column_letter].width = 50
+    parts.append("</sheetData></worksheet>")
     
     # Save to BytesIO buffer
     buffer = io.BytesIO()
-    wb.save(buffer)
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES_XML)
+        archive.writestr("_rels/.rels", _ROOT_RELS_XML)
+        archive.writestr("xl/workbook.xml", _WORKBOOK_XML)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS_XML)
+        archive.writestr("xl/styles.xml", _STYLES_XML)
+        archive.writestr("xl/worksheets/sheet1.xml", "".join(parts))
     buffer.seek(0)
     
     return buffer
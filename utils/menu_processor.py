@@ -1,6 +1,10 @@
 import io
 import re
-from typing import Dict, List, Tuple, Set, Any
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Set, Any, Pattern
 
 import pandas as pd
 
@@ -8,48 +12,103 @@ import pandas as pd
 DAY_NAMES = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY"]
 MEAL_LABELS = {"B": "Breakfast", "L": "Lunch", "S": "Snack"}
 
+# "X: value" meal lines, and the B:/L:/S: markers that open each meal section
+MEAL_LINE_PATTERN = re.compile(r"([BLS])\s*:\s*([^\n]+)", flags=re.IGNORECASE)
+MEAL_MARKER_PATTERN = re.compile(r"[BLS]\s*:\s*", re.IGNORECASE)
+MEAL_KEY_PATTERNS = {
+    key: re.compile(rf"{key}\s*:\s*", re.IGNORECASE) for key in MEAL_LABELS
+}
+
+
+# Batch AI results keyed by (cell texts, allergens, custom rules), shared by every
+# processor so re-uploads of the same menu skip the API call; oldest evicted first
+AI_CACHE_SIZE = 32
+_AI_CACHE: "OrderedDict[Tuple, Tuple[Dict[str, str], str]]" = OrderedDict()
+# Streamlit runs sessions on separate threads; guards each lookup and insert/evict
+_AI_CACHE_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def _compile_substitutions(
+    items: Tuple[Tuple[str, str], ...]
+) -> Tuple[Pattern, Pattern, Tuple[str, ...]]:
+    """Compile a substitution set into one alternation and reuse it across cells.
+
+    Originals are tried longest first so "chocolate milk" wins over "milk". Each
+    alternative is its own group; the returned replacements line up with the
+    group numbers. Later items win when two originals differ only by case.
+
+    Returns a pattern over the lowercased originals for scanning lowercased text,
+    plus an IGNORECASE fallback for text whose length changes when lowercased.
+    """
+    unique = {original.lower(): (original, replacement) for original, replacement in items}
+    ordered = sorted(unique.items(), key=lambda item: len(item[0]), reverse=True)
+    lower_pattern = re.compile("|".join(f"({re.escape(key)})" for key, _ in ordered))
+    pattern = re.compile(
+        "|".join(f"({re.escape(original)})" for _, (original, _) in ordered), re.IGNORECASE
+    )
+    return lower_pattern, pattern, tuple(replacement for _, (_, replacement) in ordered)
+
 
 class MenuProcessor:
     def __init__(self, raw_content: bytes):
         self.raw_content = raw_content
         self.original_df = self.parse_menu()
-        self.week_columns = self._find_week_columns()
-        self.day_rows = self._find_day_rows()
+        upper_cells = self._uppercase_cells()
+        self.week_columns = self._find_week_columns(upper_cells)
+        self.day_rows = self._find_day_rows(upper_cells)
         self.meal_cells = self._extract_meal_cells()
         self.substitution_map: Dict[Tuple[int, int], List[Tuple[str, str]]] = {}
+        # True when the last conversion asked the AI for help and got nothing back
+        self.ai_unavailable = False
 
     def parse_menu(self) -> pd.DataFrame:
         """Parse the raw Excel menu into a DataFrame while preserving layout."""
         try:
-            df = pd.read_excel(io.BytesIO(self.raw_content), header=None)
-        except Exception as exc:
-            raise ValueError(
-                "Unable to read the Excel file. Please confirm it matches the provided template."
-            ) from exc
+            # calamine (Rust) parses workbooks several times faster than openpyxl
+            df = pd.read_excel(io.BytesIO(self.raw_content), header=None, engine="calamine")
+        except Exception:
+            # Fall back to the default openpyxl engine if calamine is missing or fails
+            try:
+                df = pd.read_excel(io.BytesIO(self.raw_content), header=None)
+            except Exception as exc:
+                raise ValueError(
+                    "Unable to read the Excel file. Please confirm it matches the provided template."
+                ) from exc
         return df
 
-    def _find_week_columns(self) -> List[int]:
+    def _uppercase_cells(self) -> pd.DataFrame:
+        """Uppercased text of every cell as nullable strings, for vectorized searches."""
+        return self.original_df.apply(lambda col: col.astype("string").str.upper())
+
+    @staticmethod
+    def _cells_containing(upper_cells: pd.DataFrame, text: str) -> pd.DataFrame:
+        """Boolean frame marking the cells whose uppercased text contains ``text``."""
+        return upper_cells.apply(lambda col: col.str.contains(text, regex=False, na=False))
+
+    def _find_week_columns(self, upper_cells: pd.DataFrame) -> List[int]:
         """Locate columns that contain week headers (e.g., WEEK 1)."""
-        week_cols = set()
-        for col in self.original_df.columns:
-            for value in self.original_df[col].dropna():
-                if isinstance(value, str) and "WEEK" in value.upper():
-                    week_cols.add(col)
+        has_week = self._cells_containing(upper_cells, "WEEK").any(axis=0)
+        week_cols = has_week.index[has_week].tolist()
         if not week_cols:
             raise ValueError("Could not locate week columns in the uploaded file.")
         return sorted(week_cols)
 
-    def _find_day_rows(self) -> Dict[str, int]:
+    def _find_day_rows(self, upper_cells: pd.DataFrame) -> Dict[str, int]:
         """Locate rows that map to weekdays (Monday-Friday)."""
-        day_rows: Dict[str, int] = {}
-        for idx, row in self.original_df.iterrows():
-            joined = " ".join(str(cell) for cell in row if pd.notna(cell))
-            upper_row = joined.upper()
-            for day in DAY_NAMES:
-                if day in day_rows:
-                    continue
-                if day in upper_row or f"{day}S" in upper_row:
-                    day_rows[day.capitalize()] = idx
+        matching_rows = {}
+        for day in DAY_NAMES:
+            has_day = self._cells_containing(upper_cells, day).any(axis=1)
+            if has_day.any():
+                matching_rows[day] = has_day.index[has_day]
+        # When a day appears on several rows the last one wins; days stay in the
+        # order their first matching row appears
+        ordered_days = sorted(
+            matching_rows, key=lambda day: (matching_rows[day][0], DAY_NAMES.index(day))
+        )
+        day_rows: Dict[str, int] = {
+            day.capitalize(): int(matching_rows[day][-1]) for day in ordered_days
+        }
         if len(day_rows) < len(DAY_NAMES):
             missing = [d.capitalize() for d in DAY_NAMES if d.capitalize() not in day_rows]
             raise ValueError(
@@ -64,8 +123,7 @@ class MenuProcessor:
         # Search the full cell text for any "X: value" patterns instead of assuming
         # each marker starts a new line (the template sometimes has S: on the same
         # line as the lunch description).
-        pattern = re.compile(r"([BLS])\s*:\s*([^\n]+)", flags=re.IGNORECASE)
-        for match in pattern.finditer(str(cell_text)):
+        for match in MEAL_LINE_PATTERN.finditer(str(cell_text)):
             meals[match.group(1).upper()] = match.group(2).strip()
 
         return meals
@@ -73,15 +131,18 @@ class MenuProcessor:
     def _extract_meal_cells(self) -> List[Dict[str, Any]]:
         """Collect all meal cells with their coordinates and parsed content."""
         cells: List[Dict[str, Any]] = []
+        # One object array with None for blanks instead of an iloc lookup per cell
+        values = self.original_df.to_numpy(dtype=object, na_value=None)
         for week_index, col_idx in enumerate(self.week_columns, start=1):
             for day_name, row_idx in self.day_rows.items():
-                cell_value = self.original_df.iloc[row_idx, col_idx]
-                if pd.isna(cell_value) or not str(cell_value).strip():
+                cell_value = values[row_idx, col_idx]
+                cell_text = "" if cell_value is None else str(cell_value)
+                if not cell_text.strip():
                     raise ValueError(
                         f"Missing meal information for {day_name} in Week {week_index}."
                     )
 
-                meal_parts = self._parse_meal_cell(str(cell_value))
+                meal_parts = self._parse_meal_cell(cell_text)
                 missing_meals = [label for label in MEAL_LABELS if label not in meal_parts]
                 if missing_meals:
                     raise ValueError(
@@ -95,7 +156,7 @@ class MenuProcessor:
                         "day": day_name,
                         "row": row_idx,
                         "col": col_idx,
-                        "text": str(cell_value),
+                        "text": cell_text,
                         "meal_parts": meal_parts,
                     }
                 )
@@ -118,10 +179,10 @@ class MenuProcessor:
             allergens: List of allergens to avoid
             progress_callback: Optional callback function(text: str) for streaming updates
         """
-        modified_df = self.original_df.copy()
         self.substitution_map = {}
+        self.ai_unavailable = False
 
-        all_changes: Set[str] = set()
+        all_changes: List[str] = []
         replaced_meals: List[Dict[str, str]] = []
         unreplaced_meals: List[Dict[str, str]] = []
 
@@ -137,35 +198,101 @@ class MenuProcessor:
                             "text": meal_text,
                         }
                     )
-            return modified_df, [], {"replaced": replaced_meals, "unreplaced": unreplaced_meals}
+            return self.original_df.copy(), [], {"replaced": replaced_meals, "unreplaced": unreplaced_meals}
 
-        cell_contents = [cell["text"] for cell in self.meal_cells]
+        # Menus often repeat the same cell across weeks; send each distinct text once
+        # (order preserved) since the AI returns one merged substitution map
+        cell_contents = list(dict.fromkeys(cell["text"] for cell in self.meal_cells))
         ai_substitutions: Dict[str, str] = {}
 
         # Only ask the AI for help when allergens are provided; custom rules alone
         # should not trigger API calls so we can support offline/local workflows
         # (and testing) without requiring an OpenAI key.
         if allergens and cell_contents:
-            from utils.openai_service import get_batch_ai_substitutions
-            all_substitutions_list = get_batch_ai_substitutions(
-                cell_contents, allergens, custom_rules, progress_callback=progress_callback
+            cache_key = (
+                tuple(cell_contents),
+                tuple(sorted(allergens)),
+                tuple(sorted(custom_rules.items())),
             )
-            if all_substitutions_list and len(all_substitutions_list) > 0:
-                ai_substitutions = all_substitutions_list[0] or {}
+            with _AI_CACHE_LOCK:
+                cached = _AI_CACHE.get(cache_key)
+                if cached is not None:
+                    _AI_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                ai_substitutions, reasoning = dict(cached[0]), cached[1]
+                # Replay the recorded reasoning so streaming callers still see it
+                if progress_callback and reasoning:
+                    progress_callback(reasoning)
+            else:
+                reasoning_chunks: List[str] = []
+
+                def record_reasoning(chunk: str):
+                    reasoning_chunks.append(chunk)
+                    if progress_callback:
+                        progress_callback(chunk)
+
+                from utils.openai_service import get_batch_ai_substitutions
+                all_substitutions_list = get_batch_ai_substitutions(
+                    cell_contents, allergens, custom_rules, progress_callback=record_reasoning
+                )
+                if all_substitutions_list and len(all_substitutions_list) > 0:
+                    ai_substitutions = all_substitutions_list[0] or {}
+
+                # None means the call failed, so leave it uncached; an empty map is a
+                # valid answer (nothing conflicts) and is cached like any other
+                self.ai_unavailable = all_substitutions_list is None
+                if not self.ai_unavailable:
+                    with _AI_CACHE_LOCK:
+                        _AI_CACHE[cache_key] = (dict(ai_substitutions), "".join(reasoning_chunks))
+                        if len(_AI_CACHE) > AI_CACHE_SIZE:
+                            _AI_CACHE.popitem(last=False)
+
+        # Custom rules take precedence over AI suggestions
+        all_substitutions = {**ai_substitutions, **custom_rules}
+
+        # Filter and compile the rule set once per conversion rather than per cell.
+        # Cells that already mention soy milk use the variant without plain "milk"
+        # rules so they are not substituted twice.
+        rule_items = tuple(
+            (original, replacement)
+            for original, replacement in all_substitutions.items()
+            if original and replacement
+        )
+        rule_items_without_milk = tuple(
+            item for item in rule_items if item[0].lower() != 'milk'
+        )
+        compiled_rules = tuple(
+            _compile_substitutions(items) if items else None
+            for items in (rule_items, rule_items_without_milk)
+        )
+
+        # Write results into plain per-column lists and build the DataFrame once at
+        # the end, instead of copying the frame and assigning cell by cell
+        column_values = [self.original_df[col].tolist() for col in self.original_df.columns]
+
+        # Menus repeat cells across weeks; substitute each distinct text once and
+        # reuse the result (its meal parts are parsed from the same text)
+        cell_results: Dict[str, Tuple[str, List[str], List[Tuple[str, ...]]]] = {}
 
         for cell in self.meal_cells:
             row_idx, col_idx = cell["row"], cell["col"]
             original_content = cell["text"]
 
-            # Custom rules take precedence over AI suggestions
-            all_substitutions = {**ai_substitutions, **custom_rules}
-
-            new_content, cell_changes = self._apply_substitutions_to_cell(
-                original_content, all_substitutions, row_idx, col_idx, cell["meal_parts"]
-            )
+            cached_result = cell_results.get(original_content)
+            if cached_result is None:
+                new_content, cell_changes = self._apply_substitutions_to_cell(
+                    original_content, compiled_rules, row_idx, col_idx, cell["meal_parts"]
+                )
+                cell_results[original_content] = (
+                    new_content, cell_changes, self.substitution_map.get((row_idx, col_idx), [])
+                )
+            else:
+                new_content, cell_changes, cell_substitutions = cached_result
+                if cell_substitutions:
+                    self.substitution_map[(row_idx, col_idx)] = list(cell_substitutions)
 
-            modified_df.iloc[row_idx, col_idx] = new_content
-            all_changes.update(cell_changes)
+            column_values[col_idx][row_idx] = new_content
+            all_changes.extend(cell_changes)
 
             substitutions_made = self.get_substitutions_for_cell(row_idx, col_idx)
             if substitutions_made:
@@ -217,7 +344,13 @@ class MenuProcessor:
                         }
                     )
 
-        changes_list = sorted(list(all_changes))
+        modified_df = pd.DataFrame(
+            dict(zip(self.original_df.columns, column_values)),
+            index=self.original_df.index,
+            columns=self.original_df.columns,
+        )
+        # Duplicates are rare, so dedupe once here rather than on every change
+        changes_list = sorted(set(all_changes))
         summary = {"replaced": replaced_meals, "unreplaced": unreplaced_meals}
 
         return modified_df, changes_list, summary
@@ -225,75 +358,80 @@ class MenuProcessor:
     def _apply_substitutions_to_cell(
         self, 
         content: str, 
-        substitutions: Dict[str, str],
+        compiled_rules: Tuple[Optional[Tuple[Pattern, Pattern, Tuple[str, ...]]], ...],
         row_idx: int,
         col_idx: int,
         meal_parts: Dict[str, str]
-    ) -> Tuple[str, Set[str]]:
-        """Apply substitutions to a single cell and track what changed"""
-        new_content = content
-        changes = set()
+    ) -> Tuple[str, List[str]]:
+        """Apply substitutions to a single cell and track what changed
+
+        ``compiled_rules`` holds the compiled full rule set and the variant without
+        plain "milk" rules, as built by convert_menu.
+        """
+        changes: List[str] = []
         cell_substitutions = []
         
-        # Track all replacements with markers to avoid nested replacements
-        replacements_to_apply = []
+        # Case-fold the cell once and match plain lowercase literals against it
+        lower_content = content.lower()
+        
+        # Skip plain "milk" rules when the cell already has soy milk (already substituted)
+        skip_milk = 'soy milk' in lower_content
+        active_rules = compiled_rules[skip_milk]
+        if active_rules is None:
+            return content, changes
+        
+        lower_pattern, pattern, replacements = active_rules
+        if len(lower_content) == len(content):
+            matches = list(lower_pattern.finditer(lower_content))
+        else:
+            # Lowercasing changed some character's length, so positions would not line up
+            matches = list(pattern.finditer(content))
+        # Most cells match no rule; skip locating meal sections for those
+        if not matches:
+            return content, changes
         
-        # Build a map of character positions to meal types
-        meal_type_map = {}
+        # Meal sections as sorted (start, end, label) spans; sections never overlap
+        # because each one ends at the next B:/L:/S: marker
+        meal_spans = []
         for meal_key, meal_text in meal_parts.items():
             # Find the position of this meal marker (B:, L:, S:)
-            marker_pattern = re.compile(rf"{meal_key}\s*:\s*", re.IGNORECASE)
-            for marker_match in marker_pattern.finditer(content):
+            for marker_match in MEAL_KEY_PATTERNS[meal_key].finditer(content):
                 start_pos = marker_match.end()
                 # Find where this meal section ends (either next meal marker or end of content)
-                next_marker_pattern = re.compile(rf"[BLS]\s*:\s*", re.IGNORECASE)
-                next_match = next_marker_pattern.search(content, start_pos)
+                next_match = MEAL_MARKER_PATTERN.search(content, start_pos)
                 end_pos = next_match.start() if next_match else len(content)
-                # Mark all characters in this meal section
-                for pos in range(start_pos, end_pos):
-                    meal_type_map[pos] = MEAL_LABELS.get(meal_key, "Meal")
+                if start_pos < end_pos:
+                    meal_spans.append((start_pos, end_pos, MEAL_LABELS.get(meal_key, "Meal")))
+        meal_spans.sort()
+        span_starts = [span[0] for span in meal_spans]
         
-        for original, replacement in substitutions.items():
-            if not original or not replacement:
-                continue
-                
-            # Skip if already substituted
-            if original.lower() == 'milk' and 'soy milk' in new_content.lower():
-                continue
+        def meal_type_at(pos: int) -> str:
+            """Label of the meal section containing a position, or "Meal" outside all sections."""
+            idx = bisect_right(span_starts, pos) - 1
+            if idx >= 0 and pos < meal_spans[idx][1]:
+                return meal_spans[idx][2]
+            return "Meal"
+        
+        # One left-to-right pass replaces every match, so replacements are never
+        # themselves rewritten by a later rule
+        pieces = []
+        last_end = 0
+        for match in matches:
+            start_pos, end_pos = match.span()
+            matched_text = content[start_pos:end_pos]
+            replacement = replacements[match.lastindex - 1]
             
-            # Find all occurrences (case-insensitive)
-            pattern = re.compile(re.escape(original), re.IGNORECASE)
-            matches = list(pattern.finditer(new_content))
+            # Determine which meal type this occurrence belongs to
+            meal_type = meal_type_at(start_pos)
             
-            for match in matches:
-                matched_text = match.group(0)
-                start_pos = match.start()
-                
-                # Determine which meal type this occurrence belongs to
-                meal_type = meal_type_map.get(start_pos, "Meal")
-                # If exact position not found, try nearby positions
-                if meal_type == "Meal":
-                    for offset in range(max(0, start_pos - 10), min(len(content), start_pos + len(matched_text) + 10)):
-                        if offset in meal_type_map:
-                            meal_type = meal_type_map[offset]
-                            break
-                
-                marker = f"__MARKER_{len(replacements_to_apply)}__"
-                replacements_to_apply.append((matched_text, replacement, marker))
-                changes.add(f"Changed '{matched_text}' to '{replacement}'")
-                # Store with meal type: (original, replacement, meal_type)
-                cell_substitutions.append((matched_text, replacement, meal_type))
-        
-        # Apply markers
-        temp_content = new_content
-        for original, _, marker in replacements_to_apply:
-            temp_content = temp_content.replace(original, marker, 1)
-        
-        # Replace markers with final text
-        for _, replacement, marker in replacements_to_apply:
-            temp_content = temp_content.replace(marker, replacement)
-        
-        new_content = temp_content
+            changes.append(f"Changed '{matched_text}' to '{replacement}'")
+            # Store with meal type: (original, replacement, meal_type)
+            cell_substitutions.append((matched_text, replacement, meal_type))
+            pieces.append(content[last_end:start_pos])
+            pieces.append(replacement)
+            last_end = end_pos
+        pieces.append(content[last_end:])
+        new_content = "".join(pieces)
         
         # Store substitutions for this cell
         if cell_substitutions:
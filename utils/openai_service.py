@@ -1,5 +1,6 @@
 import os
 import json
+import logging
 import time
 from typing import Dict, List, Optional
 import re
@@ -7,6 +8,8 @@ import re
 import httpx
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
+
 _client_cache = None
 _client_api_key = None
 
@@ -24,8 +27,9 @@ def get_ai_substitutions(meal_description: str,
     Get substitution suggestions from OpenAI for ingredients that need to be replaced.
     For single meal processing.
     """
-    return get_batch_ai_substitutions([meal_description], allergens,
-                                      custom_rules)[0]
+    results = get_batch_ai_substitutions([meal_description], allergens,
+                                         custom_rules)
+    return results[0] if results else {}
 
 
 def resolve_api_key() -> Optional[str]:
@@ -97,7 +101,7 @@ def get_batch_ai_substitutions(
         meal_descriptions: List[str],
         allergens: List[str],
         custom_rules: Dict[str, str] = {},
-        progress_callback=None) -> List[Dict[str, str]]:
+        progress_callback=None) -> Optional[List[Dict[str, str]]]:
     """
     Get substitution suggestions from OpenAI for multiple meals at once.
 
@@ -108,7 +112,8 @@ def get_batch_ai_substitutions(
         progress_callback: Optional callback function(text: str) called with reasoning text chunks during streaming
 
     Returns:
-        List of dictionaries mapping original ingredients to their substitutions
+        List of dictionaries mapping original ingredients to their substitutions,
+        or None if the request or its response parsing failed
     """
     if not meal_descriptions:
         return []
@@ -249,9 +254,8 @@ def get_batch_ai_substitutions(
         f"DATA:\n{json.dumps(prompt_payload, ensure_ascii=False)}"
     )
 
-    print("\n=== OpenAI API Request ===")
-    print("Prompt:", prompt)
-    print(f"Model: {MODEL_NAME}")
+    logger.debug("Prompt: %s", prompt)
+    logger.debug("Model: %s", MODEL_NAME)
 
     # No strict schema here; we stream JSON text and validate after
 
@@ -592,31 +596,26 @@ def get_batch_ai_substitutions(
             retry_count += 1
             error_msg = str(e)
 
-            print(
-                f"OpenAI API error (attempt {retry_count}/{MAX_RETRIES}): {error_msg}"
-            )
+            logger.warning("OpenAI API error (attempt %s/%s): %s", retry_count, MAX_RETRIES, error_msg)
 
             if retry_count >= MAX_RETRIES:
-                print(
-                    f"Maximum retries reached ({MAX_RETRIES}). Unable to get substitutions from OpenAI."
-                )
-                return [{} for _ in meal_descriptions]
+                logger.warning("Maximum retries reached (%s). Unable to get substitutions from OpenAI.", MAX_RETRIES)
+                return None
 
             sleep_time = RETRY_DELAY * (2**(retry_count - 1))
-            print(f"Retrying in {sleep_time} seconds...")
+            logger.warning("Retrying in %s seconds...", sleep_time)
             time.sleep(sleep_time)
 
     if response is None:
-        return [{} for _ in meal_descriptions]
+        return None
 
     # Debug: Check response type
-    print(f"\n=== DEBUG: Response type ===")
-    print(f"Response type: {type(response)}")
-    print(f"Has __iter__: {hasattr(response, '__iter__')}")
-    print(f"Has status: {hasattr(response, 'status')}")
-    print(f"Has __next__: {hasattr(response, '__next__')}")
+    logger.debug("Response type: %s", type(response))
+    logger.debug("Has __iter__: %s", hasattr(response, '__iter__'))
+    logger.debug("Has status: %s", hasattr(response, 'status'))
+    logger.debug("Has __next__: %s", hasattr(response, '__next__'))
     if hasattr(response, 'status'):
-        print(f"Status: {getattr(response, 'status', None)}")
+        logger.debug("Status: %s", getattr(response, 'status', None))
     
     # Handle streaming response
     # Check if response is a stream - streams are iterable but don't have status immediately
@@ -628,18 +627,18 @@ def get_batch_ai_substitutions(
             # Streams return events, not a single response object
             if not hasattr(response, 'status'):
                 is_stream = True
-                print("DEBUG: Detected as stream (no status attribute)")
+                logger.debug("Detected as stream (no status attribute)")
             # Also check if it's a generator/iterator type
             elif hasattr(response, '__next__'):
                 is_stream = True
-                print("DEBUG: Detected as stream (has __next__)")
+                logger.debug("Detected as stream (has __next__)")
         else:
-            print("DEBUG: Not detected as stream")
+            logger.debug("Not detected as stream")
     except Exception as e:
-        print(f"DEBUG: Exception checking stream: {e}")
+        logger.debug("Exception checking stream: %s", e)
         pass
     
-    print(f"DEBUG: is_stream = {is_stream}")
+    logger.debug("is_stream = %s", is_stream)
     
     streamed_text = ""  # capture streamed output_text for final parsing
     if is_stream:
@@ -650,7 +649,7 @@ def get_batch_ai_substitutions(
         event_count = 0
         reasoning_items = {}  # Track reasoning items by ID to accumulate content
         
-        print("DEBUG: Starting to process stream...")
+        logger.debug("Starting to process stream...")
         try:
             # Process stream with timeout handling
             import signal
@@ -660,14 +659,15 @@ def get_batch_ai_substitutions(
                 # Add a small delay to allow stream to process (but this shouldn't be necessary)
                 # The stream should yield events as they come
                 event_count += 1
-                print(f"\nDEBUG: Processing event #{event_count}")
-                print(f"DEBUG: Event type: {type(event)}")
-                print(f"DEBUG: Event attributes: {dir(event)}")
+                logger.debug("Processing event #%s", event_count)
+                logger.debug("Event type: %s", type(event))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Event attributes: %s", dir(event))
                 
                 # Extract reasoning text from stream events
                 # Stream events can have different structures - check common patterns
                 event_type = getattr(event, 'type', None) or type(event).__name__
-                print(f"DEBUG: Event type value: {event_type}")
+                logger.debug("Event type value: %s", event_type)
                 
                 # Handle different event types
                 output_item = None
@@ -679,7 +679,7 @@ def get_batch_ai_substitutions(
                 delta_text = None
                 if hasattr(event, 'delta'):
                     delta_obj = getattr(event, 'delta', None)
-                    print(f"DEBUG: Event has delta attribute: {type(delta_obj)}")
+                    logger.debug("Event has delta attribute: %s", type(delta_obj))
                     if delta_obj:
                         if hasattr(delta_obj, 'text'):
                             delta_text = getattr(delta_obj, 'text', None)
@@ -692,20 +692,20 @@ def get_batch_ai_substitutions(
                 if not delta_text:
                     if hasattr(event, 'text'):
                         delta_text = getattr(event, 'text', None)
-                        print(f"DEBUG: Event has text attribute: {delta_text[:50] if delta_text else None}...")
+                        logger.debug("Event has text attribute: %s...", delta_text[:50] if delta_text else None)
                     elif hasattr(event, 'content'):
                         content_val = getattr(event, 'content', None)
                         if isinstance(content_val, str):
                             delta_text = content_val
-                        print(f"DEBUG: Event has content attribute: {delta_text[:50] if delta_text else None}...")
+                        logger.debug("Event has content attribute: %s...", delta_text[:50] if delta_text else None)
                 
                 if delta_text:
-                    print(f"DEBUG: Found delta text! Length: {len(delta_text)}")
+                    logger.debug("Found delta text! Length: %s", len(delta_text))
                     # Track by item_id if available
                     item_id = None
                     if hasattr(event, 'item_id'):
                         item_id = getattr(event, 'item_id', None)
-                        print(f"DEBUG: Delta item ID: {item_id}")
+                        logger.debug("Delta item ID: %s", item_id)
                         if item_id and item_id not in reasoning_items:
                             reasoning_items[item_id] = ""
                     
@@ -715,24 +715,22 @@ def get_batch_ai_substitutions(
                     if item_id:
                         reasoning_items[item_id] += delta_text
                     
-                    print(f"DEBUG: Accumulated reasoning from delta: {len(delta_text)} chars, total: {len(accumulated_reasoning)}")
+                    logger.debug("Accumulated reasoning from delta: %s chars, total: %s", len(delta_text), len(accumulated_reasoning))
                     if progress_callback:
                         try:
                             progress_callback(delta_text)
-                            print("DEBUG: Called progress_callback with delta successfully")
+                            logger.debug("Called progress_callback with delta successfully")
                         except Exception as e:
-                            print(f"DEBUG: Error in callback: {e}")
-                            import traceback
-                            traceback.print_exc()
+                            logger.warning("Error in callback: %s", e, exc_info=True)
                     continue  # Skip to next event - we've handled this delta
                 
                 # ResponseOutputItemAddedEvent has 'item' attribute
                 if hasattr(event, 'item'):
-                    print(f"DEBUG: Event has item attribute")
+                    logger.debug("Event has item attribute")
                     output_item = getattr(event, 'item', None)
                 # Some events might have 'output' directly
                 elif hasattr(event, 'output'):
-                    print(f"DEBUG: Event has output attribute")
+                    logger.debug("Event has output attribute")
                     output_list = getattr(event, 'output', [])
                     if isinstance(output_list, list) and len(output_list) > 0:
                         output_item = output_list[0]  # Take first item
@@ -740,11 +738,11 @@ def get_batch_ai_substitutions(
                         output_item = output_list
                 # ResponseInProgressEvent might have 'response' with output that gets updated incrementally
                 elif hasattr(event, 'response'):
-                    print(f"DEBUG: Event has response attribute")
+                    logger.debug("Event has response attribute")
                     response_obj = getattr(event, 'response', None)
                     if response_obj:
                         output_list = getattr(response_obj, 'output', None)
-                        print(f"DEBUG: Response output list: {type(output_list)}, length: {len(output_list) if isinstance(output_list, list) else 'N/A'}")
+                        logger.debug("Response output list: %s, length: %s", type(output_list), len(output_list) if isinstance(output_list, list) else 'N/A')
                         if isinstance(output_list, list) and len(output_list) > 0:
                             # Check all output items for reasoning with content
                             for idx, item in enumerate(output_list):
@@ -759,7 +757,7 @@ def get_batch_ai_substitutions(
                                 # Get the actual content value
                                 actual_content = item_content or item_text or item_output_text
                                 
-                                print(f"DEBUG: Output item #{idx}: type={item_type}, id={item_id}, has_content={actual_content is not None}")
+                                logger.debug("Output item #%s: type=%s, id=%s, has_content=%s", idx, item_type, item_id, actual_content is not None)
                                 
                                 if item_type == 'reasoning':
                                     # Initialize tracking if needed
@@ -781,16 +779,14 @@ def get_batch_ai_substitutions(
                                                 
                                                 reasoning_items[item_id] = actual_content
                                                 accumulated_reasoning += incremental
-                                                print(f"DEBUG: Found reasoning content in response! {len(incremental)} new chars")
-                                                print(f"DEBUG: Content preview: {incremental[:100]}...")
+                                                logger.debug("Found reasoning content in response! %s new chars", len(incremental))
+                                                logger.debug("Content preview: %s...", incremental[:100])
                                                 if progress_callback and incremental:
                                                     try:
                                                         progress_callback(incremental)
-                                                        print("DEBUG: Called progress_callback successfully")
+                                                        logger.debug("Called progress_callback successfully")
                                                     except Exception as e:
-                                                        print(f"DEBUG: Error in callback: {e}")
-                                                        import traceback
-                                                        traceback.print_exc()
+                                                        logger.warning("Error in callback: %s", e, exc_info=True)
                             output_item = output_list[-1]  # Take last item for other processing
                 
                 # Skip processing output_item if we already handled a content delta
@@ -799,17 +795,19 @@ def get_batch_ai_substitutions(
                 
                 # Process the output item if we found one
                 if output_item:
-                    print(f"DEBUG: Processing output item")
-                    print(f"DEBUG: Output item type: {type(output_item)}")
-                    print(f"DEBUG: Output item attributes: {[attr for attr in dir(output_item) if not attr.startswith('_')]}")
+                    logger.debug("Processing output item")
+                    logger.debug("Output item type: %s", type(output_item))
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Output item attributes: %s", [attr for attr in dir(output_item) if not attr.startswith('_')])
                     
                     entry_type = getattr(output_item, 'type', None)
-                    print(f"DEBUG: Output item type value: {entry_type}")
+                    logger.debug("Output item type value: %s", entry_type)
                     
                     if entry_type == 'reasoning':
-                        print("DEBUG: Found reasoning entry!")
+                        logger.debug("Found reasoning entry!")
                         # Debug: Print all attributes and their values
-                        print(f"DEBUG: Reasoning item dict: {output_item.model_dump() if hasattr(output_item, 'model_dump') else 'N/A'}")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Reasoning item dict: %s", output_item.model_dump() if hasattr(output_item, 'model_dump') else 'N/A')
                         
                         # Extract reasoning text - check multiple possible attributes
                         content = getattr(output_item, 'content', None)
@@ -818,21 +816,21 @@ def get_batch_ai_substitutions(
                         encrypted_content = getattr(output_item, 'encrypted_content', None)
                         summary = getattr(output_item, 'summary', None)
                         
-                        print(f"DEBUG: content: {content}")
-                        print(f"DEBUG: text_content: {text_content}")
-                        print(f"DEBUG: output_text: {output_text}")
-                        print(f"DEBUG: encrypted_content: {encrypted_content}")
-                        print(f"DEBUG: summary: {summary}")
+                        logger.debug("content: %s", content)
+                        logger.debug("text_content: %s", text_content)
+                        logger.debug("output_text: %s", output_text)
+                        logger.debug("encrypted_content: %s", encrypted_content)
+                        logger.debug("summary: %s", summary)
                         
                         # Check if this is just a placeholder and we need to wait for content events
                         # Reasoning might come in separate content delta events
                         reasoning_chunk = None
                         if output_text:
                             reasoning_chunk = str(output_text)
-                            print(f"DEBUG: Using output_text")
+                            logger.debug("Using output_text")
                         elif text_content:
                             reasoning_chunk = str(text_content)
-                            print(f"DEBUG: Using text_content")
+                            logger.debug("Using text_content")
                         elif content:
                             if isinstance(content, str):
                                 reasoning_chunk = content
@@ -840,19 +838,19 @@ def get_batch_ai_substitutions(
                                 reasoning_chunk = "".join(str(item) for item in content)
                             else:
                                 reasoning_chunk = str(content)
-                            print(f"DEBUG: Using content")
+                            logger.debug("Using content")
                         elif summary:
                             # Summary might contain reasoning text
                             if isinstance(summary, str):
                                 reasoning_chunk = summary
                             elif isinstance(summary, list):
                                 reasoning_chunk = " ".join(str(item) for item in summary)
-                            print(f"DEBUG: Using summary")
+                            logger.debug("Using summary")
                         
                         # Note: Reasoning content might come in separate delta events
                         # Track reasoning items by ID to accumulate content from multiple events
                         reasoning_id = getattr(output_item, 'id', None)
-                        print(f"DEBUG: Reasoning item ID: {reasoning_id}")
+                        logger.debug("Reasoning item ID: %s", reasoning_id)
                         
                         # Store reasoning item for tracking
                         if reasoning_id:
@@ -861,34 +859,32 @@ def get_batch_ai_substitutions(
                         
                         # Check for content delta events - these might come separately
                         # Look for response.content.delta events in the stream
-                        print(f"DEBUG: Reasoning chunk length: {len(reasoning_chunk) if reasoning_chunk else 0}")
+                        logger.debug("Reasoning chunk length: %s", len(reasoning_chunk) if reasoning_chunk else 0)
                         if reasoning_chunk:
                             # Extract only new text (incremental)
                             if reasoning_chunk.startswith(accumulated_reasoning):
                                 incremental = reasoning_chunk[len(accumulated_reasoning):]
                                 accumulated_reasoning = reasoning_chunk
-                                print(f"DEBUG: Incremental update (prefix match): {len(incremental)} chars")
+                                logger.debug("Incremental update (prefix match): %s chars", len(incremental))
                             else:
                                 incremental = reasoning_chunk
                                 accumulated_reasoning += incremental
-                                print(f"DEBUG: Incremental update (append): {len(incremental)} chars")
+                                logger.debug("Incremental update (append): %s chars", len(incremental))
                             
                             if incremental and progress_callback:
-                                print(f"DEBUG: Calling progress_callback with {len(incremental)} chars")
-                                print(f"DEBUG: Chunk preview: {incremental[:100]}...")
+                                logger.debug("Calling progress_callback with %s chars", len(incremental))
+                                logger.debug("Chunk preview: %s...", incremental[:100])
                                 try:
                                     progress_callback(incremental)
-                                    print("DEBUG: Progress callback executed successfully")
+                                    logger.debug("Progress callback executed successfully")
                                 except Exception as callback_error:
-                                    print(f"DEBUG: Error in progress callback: {callback_error}")
-                                    import traceback
-                                    traceback.print_exc()
+                                    logger.warning("Error in progress callback: %s", callback_error, exc_info=True)
                             else:
-                                print(f"DEBUG: Not calling callback - incremental: {bool(incremental)}, callback: {bool(progress_callback)}")
+                                logger.debug("Not calling callback - incremental: %s, callback: %s", bool(incremental), bool(progress_callback))
                     else:
-                        print(f"DEBUG: Output item is not reasoning type, it's: {entry_type}")
+                        logger.debug("Output item is not reasoning type, it's: %s", entry_type)
                 else:
-                    print(f"DEBUG: No output item found in this event")
+                    logger.debug("No output item found in this event")
                 
                 # Check if this is the final event with the actual response
                 # ResponseInProgressEvent has a 'response' attribute we can use
@@ -896,13 +892,13 @@ def get_batch_ai_substitutions(
                     response_obj = getattr(event, 'response', None)
                     if response_obj:
                         status = getattr(response_obj, 'status', None)
-                        print(f"DEBUG: Response status: {status}")
+                        logger.debug("Response status: %s", status)
                         if status == 'complete':
-                            print("DEBUG: Found complete response, using as final response")
+                            logger.debug("Found complete response, using as final response")
                             final_response = response_obj
                             # Don't break - might get more output items
                         elif status == 'incomplete':
-                            print("DEBUG: Response is incomplete, continuing...")
+                            logger.debug("Response is incomplete, continuing...")
                             final_response = response_obj
                             # Don't break - might get more events
                         else:
@@ -912,7 +908,7 @@ def get_batch_ai_substitutions(
                 
                 # Also check event type for completion
                 if event_type == 'response.completed' or 'completed' in str(event_type).lower():
-                    print("DEBUG: Found completion event")
+                    logger.debug("Found completion event")
                     if hasattr(event, 'response'):
                         final_response = getattr(event, 'response', None)
                     else:
@@ -922,36 +918,34 @@ def get_batch_ai_substitutions(
                 if output_item and not final_response:
                     entry_type = getattr(output_item, 'type', None)
                     if entry_type and entry_type != 'reasoning':
-                        print(f"DEBUG: Found non-reasoning output item: {entry_type}")
+                        logger.debug("Found non-reasoning output item: %s", entry_type)
                         # This might be the final JSON output
                         if hasattr(event, 'response'):
                             final_response = getattr(event, 'response', None)
             
-            print(f"DEBUG: Stream processing complete. Processed {event_count} events.")
-            print(f"DEBUG: Final response: {final_response is not None}")
-            print(f"DEBUG: Accumulated reasoning length: {len(accumulated_reasoning)}")
-            print(f"DEBUG: Accumulated output_text length: {len(accumulated_output_text)}")
+            logger.debug("Stream processing complete. Processed %s events.", event_count)
+            logger.debug("Final response: %s", final_response is not None)
+            logger.debug("Accumulated reasoning length: %s", len(accumulated_reasoning))
+            logger.debug("Accumulated output_text length: %s", len(accumulated_output_text))
             
             # Use final response if we found one, otherwise try to use last event
             if final_response:
-                print("DEBUG: Using final_response")
+                logger.debug("Using final_response")
                 response = final_response
             else:
                 # Stream completed but no final response - this shouldn't happen with structured outputs
                 # but we'll handle it gracefully
-                print("DEBUG: Warning: Stream completed but no final response found")
-                print("DEBUG: Trying to use response as-is (might be last event)")
+                logger.warning("Stream completed but no final response found")
+                logger.debug("Trying to use response as-is (might be last event)")
             # capture streamed text for parsing
             streamed_text = accumulated_output_text
         except Exception as stream_error:
-            print(f"DEBUG: Error processing stream: {stream_error}")
-            import traceback
-            traceback.print_exc()
+            logger.warning("Error processing stream: %s", stream_error, exc_info=True)
             # Fall back - try to use response as-is
             # If we have streamed output text so far, use it anyway
             streamed_text = accumulated_output_text
     else:
-        print("DEBUG: Not a stream, processing as regular response")
+        logger.debug("Not a stream, processing as regular response")
 
     # Check if response is incomplete (for non-streaming or final stream response)
     if response and hasattr(response, 'status'):
@@ -961,23 +955,22 @@ def get_batch_ai_substitutions(
             if incomplete_details:
                 reason = getattr(incomplete_details, "reason", None)
                 if reason == "max_output_tokens":
-                    print(f"\n⚠️ WARNING: Response incomplete - hit max_output_tokens limit.")
-                    print("The model used all tokens for reasoning and didn't generate the actual output.")
-                    print("Consider increasing max_output_tokens or using a model with less reasoning overhead.\n")
-                    return [{} for _ in meal_descriptions]
+                    logger.warning(
+                        "Response incomplete - hit max_output_tokens limit. The model used all tokens for "
+                        "reasoning and didn't generate the actual output; consider increasing max_output_tokens."
+                    )
+                    return None
 
     try:
-        print("\n=== OpenAI API Response ===")
         # Prefer streamed output text if available; otherwise extract from response
         if streamed_text and streamed_text.strip():
             message_content = streamed_text
-            print("DEBUG: Using streamed output_text for parsing")
+            logger.debug("Using streamed output_text for parsing")
         else:
             # Always prefer JSON since we use structured outputs where possible; here we stream JSON text
             message_content = extract_message_content(response, prefer_json=True)
         message_content = message_content or ""
-        print(message_content)
-        print("===========================================\n")
+        logger.debug("OpenAI API response:\n%s", message_content)
         try:
             # Try to extract JSON even if there's extra text before/after
             message_content = message_content.strip()
@@ -1151,7 +1144,7 @@ def get_batch_ai_substitutions(
                 deduped.extend(seen_by_id.values())
                 substitutions_list = deduped
 
-            print(f"FINAL SUBSTITUTIONS LIST: {substitutions_list}")
+            logger.debug("FINAL SUBSTITUTIONS LIST: %s", substitutions_list)
 
             # Build final mapping without post-sanitization; rely on prompt constraints
             formatted_substitutions_dict = {}
@@ -1160,13 +1153,11 @@ def get_batch_ai_substitutions(
                     sub_value = str(item["substitution"]).strip()
                     if sub_value:
                         formatted_substitutions_dict[item["original"]] = sub_value
-            print(
-                f"FORMATTED SUBSTITUTIONS LIST: {formatted_substitutions_dict}"
-            )
+            logger.debug("FORMATTED SUBSTITUTIONS LIST: %s", formatted_substitutions_dict)
             return [formatted_substitutions_dict]
         except json.JSONDecodeError as je:
-            print(f"Error parsing JSON response: {str(je)}")
-            return [{} for _ in meal_descriptions]
+            logger.warning("Error parsing JSON response: %s", je)
+            return None
     except Exception as e:
-        print(f"\nError processing AI substitutions: {str(e)}")
-        return [{} for _ in meal_descriptions]
+        logger.warning("Error processing AI substitutions: %s", e)
+        return None
@@ -1,22 +1,35 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from utils.database import SubstitutionRule
-from utils.openai_service import get_ai_substitutions
 
 
-def get_substitution_rules(allergens: List[str], db: Session = None) -> Dict[str, str]:
-    """Return substitution rules for selected allergens from the database."""
+def get_substitution_rules(
+    allergens: List[str],
+    db: Session = None,
+    prefetched: Optional[Mapping[str, Iterable[Tuple[int, str, str]]]] = None,
+) -> Dict[str, str]:
+    """Return substitution rules for selected allergens from the database.
+
+    When ``prefetched`` rules are given (grouped by allergen as
+    (id, original, replacement) rows), they are used instead of querying the
+    database again.
+    """
     custom_rules: Dict[str, str] = {}
 
-    if db:
+    if prefetched is not None:
         for allergen in allergens:
-            db_rules = db.query(SubstitutionRule).filter(
-                SubstitutionRule.allergen == allergen
-            ).all()
-
-            for rule in db_rules:
-                custom_rules[rule.original] = rule.replacement
+            for _, original, replacement in prefetched.get(allergen, []):
+                custom_rules[original] = replacement
+    elif db and allergens:
+        # One query for every allergen, then applied in the caller's allergen order
+        # so later allergens still override earlier ones
+        order = {allergen: position for position, allergen in enumerate(allergens)}
+        db_rules = db.query(SubstitutionRule).filter(
+            SubstitutionRule.allergen.in_(allergens)
+        ).order_by(SubstitutionRule.id).all()
+        for rule in sorted(db_rules, key=lambda rule: order[rule.allergen]):
+            custom_rules[rule.original] = rule.replacement
 
     return custom_rules
 
@@ -27,6 +40,8 @@ def get_ai_substitutions_for_meal(
     custom_rules: Dict[str, str],
 ) -> Dict[str, str]:
     """Get AI-powered substitutions for a specific meal description."""
+    # Imported here so loading the rule helpers doesn't pull in the OpenAI client
+    from utils.openai_service import get_ai_substitutions
     return get_ai_substitutions(meal_description, allergens, custom_rules)
 
 
@@ -38,7 +53,11 @@ def add_substitution_rule(allergen: str, original: str, replacement: str, db: Se
         replacement=replacement,
     )
     db.add(rule)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     return rule
 
 
@@ -47,6 +66,27 @@ def delete_substitution_rule(rule_id: int, db: Session) -> bool:
     rule = db.query(SubstitutionRule).filter(SubstitutionRule.id == rule_id).first()
     if rule:
         db.delete(rule)
-        db.commit()
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         return True
     return False
+
+
+def delete_substitution_rules(rule_ids: Iterable[int], db: Session) -> int:
+    """Delete several substitution rules in one statement; returns the number removed."""
+    # Plain ints so DB drivers can bind ids coming from a pandas column
+    rule_ids = [int(rule_id) for rule_id in rule_ids]
+    if not rule_ids:
+        return 0
+    deleted = db.query(SubstitutionRule).filter(
+        SubstitutionRule.id.in_(rule_ids)
+    ).delete(synchronize_session=False)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return deleted